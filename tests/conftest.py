@@ -1,6 +1,9 @@
 #  Copyright (c) 2021.  Nicolas Hamilakis
 
+import io
 import shutil
+import tarfile
+import zipfile
 from pathlib import Path
 import tempfile
 
@@ -42,3 +45,27 @@ def data_folder():
     data_dir = Path.cwd() / 'data'
     assert data_dir.is_dir(), "Data folder should be present to allow tests to be run"
     yield data_dir
+
+
+@pytest.fixture(scope="function")
+def test_archives():
+    location = Path(tempfile.mkdtemp())
+    contents = {
+        f"shard/sample{x}.txt": f"sample number {x}\n".encode() * x
+        for x in range(1, 6)
+    }
+    tar_file = location / 'shard.tar'
+    with tarfile.open(tar_file, 'w') as tar:
+        for name, data in contents.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    zip_file = location / 'shard.zip'
+    with zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_STORED) as zf:
+        for name, data in contents.items():
+            zf.writestr(name, data)
+    # yield for testing
+    yield tar_file, zip_file, contents
+    # clean up
+    shutil.rmtree(location)
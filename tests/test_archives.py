@@ -0,0 +1,152 @@
+#  Copyright (c) 2021.  Nicolas Hamilakis
+""" Testing archive backed mounts """
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from vdataset import mount, unmount, open_member
+# noinspection PyProtectedMember
+from vdataset._archives import (
+    build_archive_index, split_archive_source, members_file, load_mount_members,
+    _load_members_file, INDEX_SUFFIX
+)
+
+
+def test_split_archive_source():
+    archive, member = split_archive_source("/data/shard.tar::dir/file.wav")
+    assert str(archive) == "/data/shard.tar", "archive should be the part before the separator"
+    assert member == "dir/file.wav", "member should be the part after the separator"
+
+    with pytest.raises(ValueError):
+        _ = split_archive_source("/data/shard.tar")
+
+
+def test_archive_index(test_archives):
+    tar_file, zip_file, contents = test_archives
+
+    for archive in (tar_file, zip_file):
+        index = build_archive_index(archive)
+        assert set(index.keys()) == set(contents.keys()), f"all members of {archive} should be indexed"
+
+        cache_file = archive.with_name(f"{archive.name}{INDEX_SUFFIX}")
+        assert cache_file.is_file(), f"index of {archive} should be cached"
+        assert build_archive_index(archive) == index, "cached index should match the built one"
+
+        raw = archive.read_bytes()
+        for name, (offset, size) in index.items():
+            assert raw[offset:offset + size] == contents[name], f"{name} offset should point to its content"
+
+
+def test_archive_index_compressed(test_archives):
+    tar_file, _, _ = test_archives
+    zip_file = tar_file.with_name('compressed.zip')
+    with zipfile.ZipFile(zip_file, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('file.txt', b'some data' * 100)
+
+    with pytest.raises(ValueError):
+        _ = build_archive_index(zip_file)
+
+
+def test_open_member(test_archives):
+    tar_file, zip_file, contents = test_archives
+
+    for archive in (tar_file, zip_file):
+        for name, data in contents.items():
+            with open_member(f"{archive}::{name}") as fp:
+                assert fp.read() == data, f"{archive}::{name} should be read from the archive"
+
+                fp.seek(3)
+                assert fp.read(4) == data[3:7], "reads should respect the file position"
+
+    with pytest.raises(KeyError):
+        _ = open_member(f"{tar_file}::missing.txt")
+
+
+def test_mount_archive_members(test_archives):
+    tar_file, zip_file, contents = test_archives
+    obj = {
+        "tar": [f"{tar_file}::{name}" for name in contents.keys()],
+        "zip": [f"{zip_file}::{name}" for name in contents.keys()],
+    }
+    location = mount(obj)
+    assert not any(f.name.endswith('.json') for f in location.iterdir()), "metadata should not be in the dataset"
+
+    members = load_mount_members(location)
+    for folder in ('tar', 'zip'):
+        for name, data in contents.items():
+            item = location / folder / name.split('/')[-1]
+            assert item.is_symlink(), f"{item} should exist in the mount"
+            assert members[f"{folder}/{item.name}"].size == len(data), f"{item} should have the size of the member"
+            with pytest.raises(FileNotFoundError):
+                _ = item.open('rb')
+            with open_member(item) as fp:
+                assert fp.read() == data, f"{item} should be read from the archive"
+
+    unmount(location, safe=True)
+    assert not location.is_dir(), f"{location} should have been deleted"
+    assert not members_file(location).is_file(), "members list should be deleted with the mount"
+
+
+def test_archive_index_tar_with_zip_member(test_archives):
+    tar_file, zip_file, _ = test_archives
+    # a tar whose last member is a stored zip looks like a zip file to zipfile.is_zipfile
+    nested_tar = tar_file.with_name('nested.tar')
+    with tarfile.open(nested_tar, 'w') as tar:
+        tar.add(zip_file, arcname='sample0.zip')
+        tar.addfile(tarfile.TarInfo('padding'), io.BytesIO(b''))
+        info = tarfile.TarInfo('sample1.zip')
+        info.size = zip_file.stat().st_size
+        with zip_file.open('rb') as fp:
+            tar.addfile(info, fp)
+
+    index = build_archive_index(nested_tar)
+    assert set(index.keys()) == {'sample0.zip', 'padding', 'sample1.zip'}, "tar members should be indexed"
+
+
+def test_mount_missing_member(test_archives, tmp_path):
+    tar_file, _, contents = test_archives
+    obj = [f"{tar_file}::{name}" for name in contents.keys()] + [f"{tar_file}::missing.txt"]
+
+    with pytest.raises(KeyError):
+        _ = mount(obj, tmp_prefix=tmp_path)
+    assert list(tmp_path.iterdir()) == [], "failed mounts should not leave anything behind"
+
+
+def test_open_member_cached(test_archives):
+    tar_file, _, contents = test_archives
+    location = mount([f"{tar_file}::{name}" for name in contents.keys()])
+
+    _load_members_file.cache_clear()
+    for name, data in contents.items():
+        with open_member(location / name.split('/')[-1]) as fp:
+            assert fp.read() == data, f"{name} should be read from the archive"
+    assert _load_members_file.cache_info().misses == 1, "members list should only be parsed once"
+
+    unmount(location)
+
+
+def test_archive_member_names_normalized(test_archives):
+    tar_file, _, contents = test_archives
+    dot_tar = tar_file.with_name('dot.tar')
+    with tarfile.open(dot_tar, 'w') as tar:
+        for name, data in contents.items():
+            info = tarfile.TarInfo(f"./{name}")
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+
+    for name, data in contents.items():
+        for member in (name, f"./{name}"):
+            with open_member(f"{dot_tar}::{member}") as fp:
+                assert fp.read() == data, f"{dot_tar}::{member} should be found"
+
+
+def test_mount_corrupted_archive(test_archives, tmp_path):
+    tar_file, _, _ = test_archives
+    bad_zip = tar_file.with_name('bad.zip')
+    bad_zip.write_bytes(b'PK\x03\x04' + b'\x00' * 64)
+
+    with pytest.raises(ValueError):
+        _ = mount([f"{bad_zip}::file.txt"], tmp_prefix=tmp_path)
+    assert list(tmp_path.iterdir()) == [], "failed mounts should not leave anything behind"
@@ -7,6 +7,9 @@ import warnings
 import pytest
 
 import vdataset._mount_samples as cmd_file
+# noinspection PyProtectedMember
+from vdataset._cmd import main, argument_parser
+from vdataset import unmount
 
 
 def test_yaml_missing(yaml_missing_cmd):
@@ -59,3 +62,40 @@ def test_json_loading(data_folder):
     assert 'files' in item.keys(), "files should be a key in the dict"
     assert isinstance(item["files"], list), "dict['files'] should be a list"
     assert len(item["files"]) == 5, "list should be of size 5"
+
+
+def test_cmd_gc(data_folder, tmp_path, capsys):
+    main(["-d", str(data_folder / 'repo1'), "-t", str(tmp_path), "--lease-ttl", "0"])
+    location = Path(capsys.readouterr().out.strip())
+    assert location.is_dir(), "mounting point must exist"
+
+    main(["gc", "--prefix", str(tmp_path), "--dry-run"])
+    assert capsys.readouterr().out.strip() == str(location), "dry run should list expired mounts"
+    assert location.is_dir(), f"{location} should not be deleted in dry run mode"
+
+    main(["gc", "--prefix", str(tmp_path)])
+    assert not location.is_dir(), f"{location} should have been collected"
+
+
+def test_cmd_gc_arguments():
+    args = argument_parser().parse_args(["--unsafe", "gc", "--prefix", "somewhere"])
+    assert args.unsafe and not args.gc_unsafe, "--unsafe before the sub-command should be kept"
+
+    args = argument_parser().parse_args(["gc", "--prefix", "somewhere", "--unsafe"])
+    assert args.gc_unsafe, "--unsafe after the sub-command should be kept"
+
+    args = argument_parser().parse_args(["-d", "somewhere"])
+    assert args.lease_owner is None, "lease owner should be resolved when running the command"
+
+
+def test_cmd_multiple_keys(data_folder, capsys):
+    main(["-i", str(data_folder / 'complex.json'),
+          "-k", "folder1.folder1_1.folder1_1_1", "-k", "folder1.*.folder1_1_[23]"])
+    location = Path(capsys.readouterr().out.strip())
+    assert location.is_dir(), "mounting point must exist"
+
+    names = sorted(f.name for f in location.iterdir())
+    assert names == [f"file{x}.txt" for x in range(1, 6)], "all selected items should be merged in the mount root"
+
+    unmount(location)
+    assert not location.is_dir(), f"{location} should have been unmounted"
@@ -0,0 +1,139 @@
+#  Copyright (c) 2021.  Nicolas Hamilakis
+""" Testing mount leases & garbage collection """
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import os
+import socket
+import time
+from pathlib import Path
+
+import pytest
+
+from vdataset import mount, unmount, garbage_collect, renew_lease
+# noinspection PyProtectedMember
+import vdataset._core as core
+# noinspection PyProtectedMember
+from vdataset._lease import Lease, read_lease, lease_file, process_start_time
+
+
+@pytest.fixture(scope="function")
+def mount_prefix():
+    location = Path(tempfile.mkdtemp())
+    yield location
+    shutil.rmtree(location)
+
+
+@pytest.fixture(scope="session")
+def dead_pid():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    yield proc.pid
+
+
+def test_mount_lease(test_files_20, mount_prefix):
+    location = mount(test_files_20, tmp_prefix=mount_prefix, lease_ttl=60)
+
+    lease = read_lease(location)
+    assert lease is not None, "mount should have a lease"
+    assert lease.ttl == 60, "lease should have the given ttl"
+    assert not lease.is_orphaned(), "lease of the current process should not be orphaned"
+    assert not lease.is_expired(), "new lease should not be expired"
+    assert lease.is_expired(now=time.time() + 120), "lease should expire after its ttl"
+
+    heartbeat = lease.heartbeat
+    renew_lease(location)
+    assert read_lease(location).heartbeat >= heartbeat, "heartbeat should be updated"
+
+    unmount(location)
+    assert not location.is_dir(), f"{location} should have been deleted"
+    assert not lease_file(location).is_file(), "lease should be deleted with the mount"
+
+
+def test_garbage_collect(test_files_20, mount_prefix, dead_pid):
+    alive = mount(test_files_20, tmp_prefix=mount_prefix)
+    orphaned = [mount(test_files_20, tmp_prefix=mount_prefix, lease_owner=dead_pid) for _ in range(4)]
+    expired = mount(test_files_20, tmp_prefix=mount_prefix, lease_ttl=0)
+    unleased = Path(tempfile.mkdtemp(prefix=f"{mount_prefix}/"))
+    time.sleep(0.01)
+
+    expected = sorted(orphaned + [expired])
+    assert garbage_collect(mount_prefix, dry_run=True) == expected, "dry run should list orphaned & expired mounts"
+    for location in expected:
+        assert location.is_dir(), f"{location} should not be deleted in dry run mode"
+
+    assert garbage_collect(mount_prefix, jobs=2) == expected, "orphaned & expired mounts should be collected"
+    for location in expected:
+        assert not location.is_dir(), f"{location} should have been deleted"
+        assert not lease_file(location).is_file(), f"lease of {location} should have been deleted"
+
+    assert alive.is_dir(), "mounts of running processes should not be collected"
+    assert unleased.is_dir(), "folders without a lease should not be collected"
+
+    assert garbage_collect(mount_prefix, ttl=0) == [alive], "ttl should override the one set when mounting"
+
+
+def test_garbage_collect_safe(test_files_20, mount_prefix, dead_pid):
+    location = mount(test_files_20, tmp_prefix=mount_prefix, lease_owner=dead_pid)
+    (location / 'annoying_file.txt').touch()
+
+    assert garbage_collect(mount_prefix) == [], "safe mode should skip mounts with non symlink files"
+    assert location.is_dir(), f"{location} should not have been deleted in safe mode"
+
+    assert garbage_collect(mount_prefix, safe=False) == [location], "unsafe mode should always collect"
+    assert not location.is_dir(), f"{location} should have been deleted in unsafe mode"
+
+
+def test_garbage_collect_invalid_prefix():
+    with pytest.raises(ValueError):
+        _ = garbage_collect("/somewhere/in/the/void")
+
+
+def test_lease_pid_reused():
+    now = time.time()
+    lease = Lease(pid=os.getpid(), host=socket.gethostname(), created=now, heartbeat=now,
+                  pid_start=process_start_time(os.getpid()))
+    assert not lease.is_orphaned(), "lease of the current process should not be orphaned"
+
+    if lease.pid_start is not None:
+        lease.pid_start += 1
+        assert lease.is_orphaned(), "lease of a reused pid should be orphaned"
+
+
+def test_garbage_collect_concurrent_deletion(test_files_20, mount_prefix, dead_pid, monkeypatch):
+    locations = [mount(test_files_20, tmp_prefix=mount_prefix, lease_owner=dead_pid) for _ in range(3)]
+    deleted = locations[1]
+    unmount_fn = core.unmount
+
+    def concurrent_unmount(location, **kwargs):
+        if location == deleted:
+            # another collection deleted the dataset in the meantime
+            unmount_fn(location)
+        return unmount_fn(location, **kwargs)
+
+    monkeypatch.setattr(core, 'unmount', concurrent_unmount)
+    assert garbage_collect(mount_prefix) == sorted([locations[0], locations[2]]), \
+        "datasets deleted concurrently should be skipped"
+    for location in locations:
+        assert not location.is_dir(), f"{location} should have been deleted"
+
+
+def test_renew_lease_concurrent(test_files_20, mount_prefix):
+    location = mount(test_files_20, tmp_prefix=mount_prefix)
+
+    def renew():
+        for _ in range(50):
+            renew_lease(location)
+
+    threads = [threading.Thread(target=renew) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert read_lease(location) is not None, "lease should stay valid with concurrent renewals"
+    assert sorted(f.name for f in mount_prefix.iterdir()) == sorted([location.name, lease_file(location).name]), \
+        "no temporary lease file should be left behind"
+    unmount(location)
@@ -192,3 +192,28 @@ def test_mount_json_complex(data_folder):
 
     unmount(location)
     assert not location.is_dir(), f"{location} should have been unmounted"
+
+
+def test_mount_json_multiple_keys(data_folder):
+    location = mount_from_index_file(
+        data_folder / 'complex.json', key=["folder1.folder1_1.folder1_1_1", "folder1.folder1_1.folder1_1_[23]"])
+    assert location.is_dir(), "mounting point must exist"
+
+    names = sorted(f.name for f in location.iterdir())
+    assert names == [f"file{x}.txt" for x in range(1, 6)], "all selected items should be merged in the mount root"
+
+    unmount(location)
+    assert not location.is_dir(), f"{location} should have been unmounted"
+
+
+def test_mount_conflicts(data_folder, test_files_20):
+    obj = [test_files_20[0], data_folder / 'repo1' / 'file1.txt']
+
+    with pytest.raises(FileExistsError):
+        _ = mount(obj)
+
+    location = mount(obj, on_conflict='last')
+    assert (location / 'file1.txt').resolve() == obj[1].resolve(), "last file should be kept on conflicts"
+
+    unmount(location)
+    assert not location.is_dir(), f"{location} should have been unmounted"
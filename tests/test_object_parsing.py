@@ -6,9 +6,9 @@ from pathlib import Path
 import pytest
 
 # noinspection PyProtectedMember
-from vdataset._mount_samples import key_extractor
+from vdataset._mount_samples import key_extractor, key_selector
 # noinspection PyProtectedMember
-from vdataset._core import parse_input, FileTarget
+from vdataset._core import parse_input, resolve_conflicts, FileTarget
 
 
 def test_parsing_invalid():
@@ -103,3 +103,57 @@ def test_dict_extractor():
 
     with pytest.raises(KeyError):
         key_extractor(obj, "nonsense.is.never.a.good.key")
+
+
+def test_key_selector():
+    obj = {
+        "train": {
+            "speakerA": {"clean": ["a1.wav", "a2.wav"], "noisy": ["a3.wav"]},
+            "speakerB": {"clean": ["b1.wav"], "noisy": ["b2.wav"]},
+        },
+        "test": [
+            {"clean": ["t1.wav"]},
+            {"clean": ["t2.wav"]}
+        ]
+    }
+    assert key_selector(obj, "train.speakerA") == [obj["train"]["speakerA"]], "single key should select one item"
+    assert key_selector(obj, ["train.speakerA.clean", "train.speakerB.clean"]) == [
+        obj["train"]["speakerA"]["clean"], obj["train"]["speakerB"]["clean"]
+    ], "multiple keys should select items in order"
+    assert key_selector(obj, "train.*.clean") == [
+        obj["train"]["speakerA"]["clean"], obj["train"]["speakerB"]["clean"]
+    ], "glob segments should select all matching items"
+    assert key_selector(obj, "test.1.clean") == [["t2.wav"]], "list items should be selected by index"
+    assert key_selector(obj, "test.*.clean") == [["t1.wav"], ["t2.wav"]], "glob segments should match list indexes"
+    assert key_selector(obj, ["train.speakerA", "train.speaker[A]"]) == [obj["train"]["speakerA"]], \
+        "items selected multiple times should only be returned once"
+
+    with pytest.raises(KeyError):
+        key_selector(obj, ["train.speakerA", "train.*.bad_item"])
+
+
+def test_resolve_conflicts():
+    root = Path('root')
+    obj = [
+        FileTarget(source_file=Path('dir1/file1.txt'), target_location=Path('folder')),
+        FileTarget(source_file=Path('dir2/file1.txt'), target_location=Path('folder')),
+        FileTarget(source_file=Path('dir1/file1.txt'), target_location=Path('folder')),
+    ]
+    with pytest.raises(FileExistsError):
+        _ = resolve_conflicts(obj, root, on_conflict='error')
+
+    targets = resolve_conflicts(obj[::2], root)
+    assert targets == {root / 'folder/file1.txt': Path('dir1/file1.txt').resolve()}, \
+        "duplicate entries are not a conflict"
+
+    same_file = [obj[0], FileTarget(source_file=Path('dir1/file1.txt').resolve(), target_location=Path('folder'))]
+    assert len(resolve_conflicts(same_file, root)) == 1, "relative & absolute paths to a file are not a conflict"
+
+    targets = resolve_conflicts(obj, root, on_conflict='first')
+    assert targets[root / 'folder/file1.txt'] == Path('dir1/file1.txt').resolve(), "first source should be kept"
+
+    targets = resolve_conflicts(obj[:2], root, on_conflict='last')
+    assert targets[root / 'folder/file1.txt'] == Path('dir2/file1.txt').resolve(), "last source should be kept"
+
+    with pytest.raises(ValueError):
+        _ = resolve_conflicts(obj, root, on_conflict='unknown')
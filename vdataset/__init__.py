@@ -1,17 +1,23 @@
 #  Copyright (c) 2021.  Nicolas Hamilakis
 
 from ._core import (
-    mount, unmount,
+    mount, unmount, garbage_collect,
     FileTarget, FileList, FileTargetList
 )
+from ._lease import renew_lease
+from ._archives import open_member, ArchiveMember
 from ._mount_samples import mount_from_location, mount_from_index_file
 
 
 __all__ = [
     'mount',
     'unmount',
+    'garbage_collect',
+    'renew_lease',
     'mount_from_index_file',
     'mount_from_location',
+    'open_member',
+    'ArchiveMember',
     'FileTarget',
     'FileList',
     'FileTargetList'
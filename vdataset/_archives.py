@@ -0,0 +1,298 @@
+#  Copyright (c) 2021.  Nicolas Hamilakis
+
+import io
+import json
+import os
+import posixpath
+import struct
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Union, Tuple, Optional
+
+ARCHIVE_SEPARATOR = '::'
+INDEX_SUFFIX = '.vdindex.json'
+MEMBERS_SUFFIX = '.vdmembers.json'
+
+# magic numbers starting a zip file (local file header & empty archive)
+_ZIP_MAGIC = (b'PK\x03\x04', b'PK\x05\x06')
+
+# size of the fixed part of a zip local file header (see APPNOTE.TXT 4.3.7)
+_ZIP_LOCAL_HEADER = struct.Struct('<4s5H3L2H')
+
+
+@dataclass
+class ArchiveMember:
+    archive: Path
+    member: str
+    offset: int
+    size: int
+
+    @property
+    def name(self) -> str:
+        return Path(self.member).name
+
+    @property
+    def source(self) -> str:
+        return f"{self.archive}{ARCHIVE_SEPARATOR}{self.member}"
+
+
+def is_archive_source(source: Union[Path, str]) -> bool:
+    """ Check if a source entry points inside an archive (archive.tar::member) """
+    return ARCHIVE_SEPARATOR in str(source)
+
+
+def source_name(source: Union[Path, str]) -> str:
+    """ Name of the file a source entry is exposed as (the member basename for archive sources) """
+    if is_archive_source(source):
+        return Path(str(source).partition(ARCHIVE_SEPARATOR)[2]).name
+    return Path(source).name
+
+
+def normalize_member(member: str) -> str:
+    """ Normalize a member name (archives built from '.' store members as ./path/to/member) """
+    return posixpath.normpath(member).lstrip('/')
+
+
+def split_archive_source(source: Union[Path, str]) -> Tuple[Path, str]:
+    """ Split an archive source entry into archive location & member name
+
+    :param source: a source in the format archive.tar::path/to/member
+    :return: the resolved archive path, the normalized member name
+    :raises ValueError if the source does not point inside an archive
+    """
+    archive, sep, member = str(source).partition(ARCHIVE_SEPARATOR)
+    if not sep or not archive or not member:
+        raise ValueError(f"{source} is not a valid archive member (expected archive::member)")
+    return Path(archive).resolve(), normalize_member(member)
+
+
+def _index_tar(archive: Path) -> Dict[str, Tuple[int, int]]:
+    """ Build member offsets of an uncompressed tar archive """
+    members = {}
+    try:
+        with tarfile.open(archive, mode='r:') as tar:
+            for info in tar:
+                if info.isfile() and not info.issparse():
+                    members[normalize_member(info.name)] = (info.offset_data, info.size)
+    except tarfile.TarError as e:
+        raise ValueError(f"{archive} is not a valid uncompressed tar archive, members cannot be read by offset ({e})")
+    return members
+
+
+def _index_zip(archive: Path) -> Dict[str, Tuple[int, int]]:
+    """ Build member offsets of a zip archive (only stored members are indexed) """
+    members = {}
+    try:
+        with zipfile.ZipFile(archive) as zf, archive.open('rb') as fp:
+            for info in zf.infolist():
+                if info.is_dir():
+                    continue
+                if info.compress_type != zipfile.ZIP_STORED:
+                    raise ValueError(f"{archive}::{info.filename} is compressed, members cannot be read by offset")
+                # data offset depends on the local header, which may differ from the central directory one
+                fp.seek(info.header_offset)
+                header = _ZIP_LOCAL_HEADER.unpack(fp.read(_ZIP_LOCAL_HEADER.size))
+                name_len, extra_len = header[-2], header[-1]
+                offset = info.header_offset + _ZIP_LOCAL_HEADER.size + name_len + extra_len
+                members[normalize_member(info.filename)] = (offset, info.file_size)
+    except (zipfile.BadZipFile, struct.error) as e:
+        raise ValueError(f"{archive} is not a valid zip archive ({e})")
+    return members
+
+
+def build_archive_index(archive: Union[Path, str]) -> Dict[str, Tuple[int, int]]:
+    """ Build (or load from cache) the offset index of an archive.
+
+    The index is cached next to the archive as `<archive>.vdindex.json` and is rebuilt
+    when the archive size or modification time changes.
+
+    :param archive: location of the tar/zip archive
+    :return: a dict mapping member names to (offset, size)
+    :raises ValueError if the archive is not a supported format
+    """
+    if isinstance(archive, str):
+        archive = Path(archive)
+
+    if not archive.is_file():
+        raise ValueError(f'Archive {archive} does not exist')
+
+    stat = archive.stat()
+    return _load_archive_index(archive, stat.st_mtime_ns, stat.st_size)
+
+
+def _is_zip(archive: Path) -> bool:
+    """ Check if an archive is a zip file (zipfile.is_zipfile also accepts tar files ending with a zip member) """
+    with archive.open('rb') as fp:
+        return fp.read(4) in _ZIP_MAGIC
+
+
+@lru_cache(maxsize=256)
+def _load_archive_index(archive: Path, mtime_ns: int, size: int) -> Dict[str, Tuple[int, int]]:
+    """ Load the offset index of an archive from its cache file or build it (cached in memory by archive version) """
+    cache_file = archive.with_name(f"{archive.name}{INDEX_SUFFIX}")
+
+    if cache_file.is_file():
+        try:
+            with cache_file.open() as fp:
+                cached = json.load(fp)
+            if cached['mtime_ns'] == mtime_ns and cached['size'] == size:
+                return {normalize_member(k): tuple(v) for k, v in cached['members'].items()}
+        except (ValueError, KeyError):
+            pass  # corrupted cache, rebuild it
+
+    if _is_zip(archive):
+        members = _index_zip(archive)
+    else:
+        members = _index_tar(archive)
+
+    # write to a temporary file first as concurrent mounts may index the same archive
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with tmp_file.open('w') as fp:
+            json.dump(dict(mtime_ns=mtime_ns, size=size, members=members), fp)
+        tmp_file.replace(cache_file)
+    except OSError:
+        # read-only location, the index is just not cached
+        if tmp_file.is_file():
+            tmp_file.unlink()
+
+    return members
+
+
+class ArchiveIndex:
+    """ Lazily built collection of archive indexes (each archive is indexed once) """
+
+    def __init__(self):
+        self._indexes: Dict[Path, Dict[str, Tuple[int, int]]] = {}
+
+    def lookup(self, source: Union[Path, str]) -> ArchiveMember:
+        """ Find the location of a member inside its archive
+
+        :param source: the archive source entry (archive.tar::member)
+        :return: ArchiveMember
+        :raises KeyError if the member does not exist in the archive
+        """
+        archive, member = split_archive_source(source)
+        if archive not in self._indexes:
+            self._indexes[archive] = build_archive_index(archive)
+
+        try:
+            offset, size = self._indexes[archive][member]
+        except KeyError:
+            raise KeyError(f"{member} was not found in {archive} !!")
+        return ArchiveMember(archive=archive, member=member, offset=offset, size=size)
+
+
+class ArchiveMemberReader(io.RawIOBase):
+    """ Read-only file object serving the content of an archive member using pread """
+
+    def __init__(self, member: ArchiveMember):
+        super().__init__()
+        self.member = member
+        self._fd = os.open(member.archive, os.O_RDONLY)
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            new_pos = pos
+        elif whence == io.SEEK_CUR:
+            new_pos = self._pos + pos
+        elif whence == io.SEEK_END:
+            new_pos = self.member.size + pos
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+
+        if new_pos < 0:
+            raise ValueError(f"negative seek position {new_pos}")
+        self._pos = new_pos
+        return self._pos
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), max(self.member.size - self._pos, 0))
+        if size == 0:
+            return 0
+        data = os.pread(self._fd, size, self.member.offset + self._pos)
+        buffer[:len(data)] = data
+        self._pos += len(data)
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+
+def members_file(root_dir: Path) -> Path:
+    """ Location of the archive members list of a mounted dataset (stored next to it) """
+    root_dir = Path(os.path.abspath(root_dir))
+    return root_dir.with_name(f"{root_dir.name}{MEMBERS_SUFFIX}")
+
+
+def load_mount_members(root_dir: Path) -> Dict[str, ArchiveMember]:
+    """ Load the archive members exposed in a mounted dataset """
+    location = members_file(root_dir)
+    try:
+        stat = location.stat()
+    except FileNotFoundError:
+        return {}
+    return _load_members_file(location, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=32)
+def _load_members_file(location: Path, mtime_ns: int, size: int) -> Dict[str, ArchiveMember]:
+    """ Parse a members list file (cached in memory by file version) """
+    with location.open() as fp:
+        members = json.load(fp)
+    return {
+        k: ArchiveMember(archive=Path(v['archive']), member=v['member'], offset=v['offset'], size=v['size'])
+        for k, v in members.items()
+    }
+
+
+def save_mount_members(root_dir: Path, members: Dict[str, ArchiveMember]):
+    """ Save the archive members exposed in a mounted dataset """
+    with members_file(root_dir).open('w') as fp:
+        json.dump({
+            k: dict(archive=str(m.archive), member=m.member, offset=m.offset, size=m.size)
+            for k, m in members.items()
+        }, fp)
+
+
+def _find_mounted_member(location: Path) -> Optional[ArchiveMember]:
+    """ Find the archive member a file of a mounted dataset points to """
+    location = location.absolute()
+    for parent in location.parents:
+        if members_file(parent).is_file():
+            return load_mount_members(parent).get(str(location.relative_to(parent)))
+    return None
+
+
+def open_member(location: Union[Path, str]) -> io.BufferedReader:
+    """ Open an archive member for reading without extracting it.
+
+    :param location: either an archive source entry (archive.tar::member) or
+        the location of an archive member inside a mounted dataset
+    :return: a binary file object reading the member content from the archive
+    :raises ValueError if the location is not an archive member
+    """
+    if is_archive_source(location):
+        member = ArchiveIndex().lookup(location)
+    else:
+        member = _find_mounted_member(Path(location))
+
+    if member is None:
+        raise ValueError(f'{location} is not an archive member')
+
+    return io.BufferedReader(ArchiveMemberReader(member))
@@ -1,11 +1,12 @@
 #  Copyright (c) 2021.  Nicolas Hamilakis
 
 import argparse
+import os
 import sys
 from pathlib import Path
 
 from ._mount_samples import mount_from_location, mount_from_index_file
-from ._core import unmount
+from ._core import unmount, garbage_collect, CONFLICT_POLICIES
 
 
 def argument_parser():
@@ -19,11 +20,31 @@ def argument_parser():
 
     # extra options
     parser.add_argument("--unsafe", action='store_true', help="practice unsafe unmounting techniques (default: false)")
-    parser.add_argument("-k", "--index-key", type=str,
-                        help="path to sub-item when loading index object (delimited by dots ex: key1.item3)")
+    parser.add_argument("-k", "--index-key", type=str, action="append",
+                        help="path to sub-item when loading index object (delimited by dots ex: key1.item3), "
+                             "glob patterns are allowed (ex: train.*.clean) (list)")
+    parser.add_argument("--on-conflict", type=str, choices=CONFLICT_POLICIES, default='error',
+                        help="policy when different files share the same target name (default: error)")
     parser.add_argument("-t", "--tmp-prefix", type=str, help="Use this location as a prefix for creating mount point")
     parser.add_argument("-s", "--keep-structure", type=str, help="Keep directory structure when mounting from dir")
     parser.add_argument("-p", "--pattern", action="append", help="Pattern to match when mounting from dir (list)")
+    parser.add_argument("--lease-ttl", type=float,
+                        help="time (in seconds) after which a mount without heartbeat can be garbage collected")
+    parser.add_argument("--lease-owner", type=int,
+                        help="pid of the process owning the mount, the mount is garbage collected when it exits "
+                             "(default: the process calling vmount, in a pipeline or a $(...) substitution "
+                             "it is a short-lived subshell, use --lease-owner $$ instead)")
+
+    # sub-commands
+    subparsers = parser.add_subparsers(dest="command")
+    gc_parser = subparsers.add_parser("gc", help="unmount orphaned or expired mounts under a prefix")
+    gc_parser.add_argument("--prefix", type=str, required=True, help="location used as prefix when mounting")
+    gc_parser.add_argument("--ttl", type=float, help="time (in seconds) after the last heartbeat when a mount "
+                                                     "is expired (default: ttl set when mounting)")
+    gc_parser.add_argument("-j", "--jobs", type=int, default=8, help="number of concurrent unmounts (default: 8)")
+    gc_parser.add_argument("--dry-run", action='store_true', help="only list the mounts to collect")
+    gc_parser.add_argument("--unsafe", action='store_true', dest="gc_unsafe",
+                           help="practice unsafe unmounting techniques (default: false)")
 
     return parser
 
@@ -37,18 +58,38 @@ def main(argv=None):
     else:
         args = parser.parse_args()
 
-    if args.umount:
+    lease_owner = args.lease_owner
+    if lease_owner is None and argv is None:
+        # vmount exits right after mounting, the mount belongs to the calling process
+        lease_owner = os.getppid()
+        if os.getpgid(lease_owner) != lease_owner and (args.mount_from_index or args.mount_from_dir):
+            print(f"warning: mount owner {lease_owner} is not a process group leader, it may be a short-lived "
+                  f"subshell (pipeline or $(...)) and the mount can be garbage collected when it exits, "
+                  f"set --lease-owner to the pid of the job using the mount", file=sys.stderr)
+
+    if args.command == "gc":
+        locations = garbage_collect(args.prefix, ttl=args.ttl, dry_run=args.dry_run,
+                                    jobs=args.jobs, safe=not (args.unsafe or args.gc_unsafe))
+        for location in locations:
+            print(f"{location}")
+        if not args.dry_run:
+            print(f"successfully unmounted {len(locations)} mounts from {args.prefix}")
+
+    elif args.umount:
         unmount(args.umount, safe=not args.unsafe)
         print(f"successfully unmounted {args.umount}")
 
     elif args.mount_from_index:
         mount_index_file = Path(args.mount_from_index)
-        location = mount_from_index_file(mount_index_file, key=args.index_key, tmp_prefix=args.tmp_prefix)
+        location = mount_from_index_file(mount_index_file, key=args.index_key, tmp_prefix=args.tmp_prefix,
+                                         on_conflict=args.on_conflict, lease_ttl=args.lease_ttl,
+                                         lease_owner=lease_owner)
         print(f"{location}")
 
     elif args.mount_from_dir:
         location = mount_from_location(
-            args.mount_from_dir, keep_structure=args.keep_structure, file_regexp=args.pattern)
+            args.mount_from_dir, keep_structure=args.keep_structure, file_regexp=args.pattern,
+            tmp_prefix=args.tmp_prefix, lease_ttl=args.lease_ttl, lease_owner=lease_owner)
         print(f"{location}")
 
     else:
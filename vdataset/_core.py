@@ -1,10 +1,19 @@
 #  Copyright (c) 2021.  Nicolas Hamilakis
 
-import shutil
+import os
 import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
-from typing import NewType, List, Union, Dict, Optional
+from typing import NewType, List, Union, Dict, Optional, Tuple
+
+from ._archives import (
+    ArchiveIndex, ArchiveMember, ARCHIVE_SEPARATOR,
+    is_archive_source, source_name, split_archive_source,
+    save_mount_members, members_file
+)
+from ._lease import write_lease, read_lease, lease_file, LEASE_SUFFIX
 
 
 # typing
@@ -44,11 +53,65 @@ def parse_input(file_object: FileList, root_dir: Path) -> FileTargetList:
     return result
 
 
-def mount(input_files: Union[FileList, Dict], *, tmp_prefix: Optional[Union[Path, str]] = None) -> Optional[Path]:
+CONFLICT_POLICIES = ('error', 'first', 'last')
+
+
+def resolve_conflicts(file_list: FileTargetList, root_dir: Path, *, on_conflict: str = 'error') -> Dict[Path, Path]:
+    """ Map every target file of the list to its source, applying a policy on conflicting targets
+
+    Entries with the same source (once resolved) and the same target are only kept once and are not
+    considered a conflict.
+
+    :param file_list: the list of files to mount
+    :param root_dir: the root directory of the mount
+    :param on_conflict: policy when two different sources share a target: 'error' raises a FileExistsError,
+        'first' keeps the first source, 'last' keeps the last source
+    :return: a dict mapping target file locations to their resolved source
+    :raises FileExistsError if a conflict is found and the policy is 'error'
+    """
+    if on_conflict not in CONFLICT_POLICIES:
+        raise ValueError(f'Unknown conflict policy {on_conflict}, must be one of {CONFLICT_POLICIES}')
+
+    targets: Dict[Path, Path] = {}
+    for item in file_list:
+        if is_archive_source(item.source_file):
+            archive, member = split_archive_source(item.source_file)
+            source = Path(f"{archive}{ARCHIVE_SEPARATOR}{member}")
+        else:
+            source = Path(item.source_file).resolve()
+        target = root_dir / item.target_location / source_name(source)
+
+        if target in targets and targets[target] != source:
+            if on_conflict == 'error':
+                raise FileExistsError(f"{target.relative_to(root_dir)} is targeted by both "
+                                      f"{targets[target]} and {source}")
+            elif on_conflict == 'first':
+                continue
+        targets[target] = source
+    return targets
+
+
+def mount(input_files: Union[FileList, Dict], *, tmp_prefix: Optional[Union[Path, str]] = None,
+          on_conflict: str = 'error', lease_ttl: Optional[float] = None,
+          lease_owner: Optional[int] = None) -> Optional[Path]:
     """ Creates a virtual dataset from input file list
 
+    Files can also point inside an uncompressed tar or a zip archive (``archive.tar::path/to/member``),
+    those members are exposed as dangling symlinks to ``archive.tar::path/to/member`` (their size is
+    kept in the members list stored next to the mount) and their content is read from the archive
+    using ``open_member``.
+
+    A lease (owner process, host, creation & heartbeat time) is written next to the dataset to allow
+    garbage collection of mounts whose owner is gone (see ``garbage_collect``).
+
+    .. warning:: archive members are placeholders, reading them with a plain ``open`` fails
+        (FileNotFoundError), use ``open_member`` instead.
+
     :param input_files: list of files to include in the mounted dataset
     :param tmp_prefix: prefix of location to create the temporary files
+    :param on_conflict: policy when different files share the same target name ['error', 'first', 'last']
+    :param lease_ttl: time (in seconds) after the last heartbeat when the mount is considered expired
+    :param lease_owner: pid of the process owning the mount (default: current process)
     :return: location of the new virtual dataset
     """
     if isinstance(tmp_prefix, str):
@@ -63,34 +126,145 @@ def mount(input_files: Union[FileList, Dict], *, tmp_prefix: Optional[Union[Path
     else:
         root_dir = Path(tempfile.mkdtemp())
 
-    file_list: FileTargetList = parse_input(input_files, root_dir)
+    # resolve targets & archive members before creating anything
+    archive_index = ArchiveIndex()
+    try:
+        file_list: FileTargetList = parse_input(input_files, root_dir)
+        targets = resolve_conflicts(file_list, root_dir, on_conflict=on_conflict)
+        sources = {
+            target: archive_index.lookup(source) if is_archive_source(source) else source
+            for target, source in targets.items()
+        }
+    except Exception:
+        root_dir.rmdir()
+        raise
 
-    for item in file_list:
+    write_lease(root_dir, ttl=lease_ttl, owner=lease_owner)
+
+    members: Dict[str, ArchiveMember] = {}
+    folders = {root_dir}
+
+    for target, source in sources.items():
         # create folder if necessary
-        location = root_dir / item.target_location
-        location.mkdir(exist_ok=True, parents=True)
-        # symlink
-        (location / item.source_file.name).symlink_to(item.source_file.resolve())
+        if target.parent not in folders:
+            target.parent.mkdir(exist_ok=True, parents=True)
+            folders.add(target.parent)
+
+        if isinstance(source, ArchiveMember):
+            # dangling symlink to archive::member (no data is copied), plain reads fail for every user
+            target.symlink_to(source.source)
+            members[str(target.relative_to(root_dir))] = source
+        else:
+            # symlink (source is already resolved)
+            target.symlink_to(source)
+
+    if members:
+        save_mount_members(root_dir, members)
 
     # return root location
     return root_dir
 
 
-def unmount(location: Union[str, Path], *, safe: bool = True):
+def _scan_mount(location: Path) -> Tuple[List[os.DirEntry], List[str]]:
+    """ List the files & folders of a dataset in a single traversal (folders are listed top-down) """
+    files, folders = [], [str(location)]
+    for folder in folders:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    folders.append(entry.path)
+                else:
+                    files.append(entry)
+    return files, folders
+
+
+def _remove_metadata(location: Path):
+    """ Remove the metadata stored next to a mounted dataset """
+    for metadata in (members_file(location), lease_file(location)):
+        try:
+            metadata.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def unmount(location: Union[str, Path], *, safe: bool = True) -> bool:
     """ Unmount a dataset folder.
 
     :param location: location of dataset to unmount
     :param safe: Safe mode prevents deletion if non symlink files are found in the dataset (default True).
+    :return: True if the dataset was deleted
     """
     if isinstance(location, str):
         location = Path(location)
 
     try:
+        files, folders = _scan_mount(location)
+
         if safe:
-            for file in location.rglob("*"):
-                if not file.is_dir() and not file.is_symlink():
+            for entry in files:
+                if not entry.is_symlink():
                     raise ValueError('found non symlink files')
 
-        shutil.rmtree(location)
+        for entry in files:
+            os.unlink(entry.path)
+        for folder in reversed(folders):
+            os.rmdir(folder)
+        _remove_metadata(location)
     except ValueError:
         print(f"Found non symlink files in {location}, safe mode skipped deletion")
+        return False
+    return True
+
+
+def garbage_collect(prefix: Union[str, Path], *, ttl: Optional[float] = None, dry_run: bool = False,
+                    jobs: int = 8, safe: bool = True) -> List[Path]:
+    """ Unmount all orphaned or expired datasets mounted under a prefix.
+
+    A dataset is orphaned when the process that mounted it no longer exists (only checked for
+    datasets mounted on this host), and expired when its last heartbeat is older than its ttl.
+    Folders without a lease are never collected.
+
+    :param prefix: location used as tmp_prefix when mounting
+    :param ttl: time to live in seconds after the last heartbeat, overrides the one set at mount time
+    :param dry_run: only list the datasets that would be unmounted
+    :param jobs: maximum number of datasets being unmounted concurrently
+    :param safe: unmount in safe mode (see ``unmount``)
+    :return: list of unmounted datasets (or datasets to unmount in dry run mode), datasets that
+        could not be unmounted are reported and skipped
+    """
+    if isinstance(prefix, str):
+        prefix = Path(prefix)
+
+    if not prefix.is_dir():
+        raise ValueError(f'Prefix {prefix} must be a valid directory')
+
+    now = time.time()
+    collectable = []
+    with os.scandir(prefix) as it:
+        for entry in it:
+            if not entry.name.endswith(LEASE_SUFFIX):
+                continue
+            location = Path(entry.path[:-len(LEASE_SUFFIX)])
+            lease = read_lease(location)
+            if lease is not None and (lease.is_orphaned() or lease.is_expired(ttl, now=now)):
+                collectable.append(location)
+    collectable.sort()
+
+    if dry_run:
+        return collectable
+
+    def collect(location: Path) -> bool:
+        try:
+            if not location.is_dir():
+                # dataset already deleted, only the metadata remains
+                _remove_metadata(location)
+                return True
+            return unmount(location, safe=safe)
+        except OSError as e:
+            # dataset deleted concurrently (by its owner or another collection) or not deletable
+            print(f"Could not unmount {location} ({e}), skipped")
+            return False
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(collect, collectable))
+    return [loc for loc, deleted in zip(collectable, results) if deleted]
@@ -0,0 +1,119 @@
+#  Copyright (c) 2021.  Nicolas Hamilakis
+
+import json
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Optional, Union
+
+LEASE_SUFFIX = '.vdlease.json'
+
+
+@dataclass
+class Lease:
+    pid: int
+    host: str
+    created: float
+    heartbeat: float
+    ttl: Optional[float] = None
+    pid_start: Optional[int] = None
+
+    def is_orphaned(self) -> bool:
+        """ Check if the process owning the lease is gone (only known for leases owned by this host) """
+        if self.host != socket.gethostname():
+            return False
+        try:
+            os.kill(self.pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            # process exists but belongs to another user
+            pass
+        # the pid may have been reused by another process
+        return self.pid_start is not None and process_start_time(self.pid) != self.pid_start
+
+    def is_expired(self, ttl: Optional[float] = None, now: Optional[float] = None) -> bool:
+        """ Check if the lease heartbeat is older than its time to live
+
+        :param ttl: time to live in seconds, overrides the one set in the lease
+        :param now: current timestamp (default: time.time())
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        if ttl is None:
+            return False
+        now = now if now is not None else time.time()
+        return now - self.heartbeat > ttl
+
+
+def process_start_time(pid: int) -> Optional[int]:
+    """ Start time of a process (in clock ticks since boot), None if unknown (process gone or no /proc) """
+    try:
+        with open(f"/proc/{pid}/stat") as fp:
+            stat = fp.read()
+    except OSError:
+        return None
+    # the process name (2nd field) is in parentheses and may contain spaces
+    fields = stat[stat.rindex(')') + 2:].split()
+    return int(fields[19])
+
+
+def lease_file(root_dir: Path) -> Path:
+    """ Location of the lease of a mounted dataset (stored next to it) """
+    root_dir = Path(os.path.abspath(root_dir))
+    return root_dir.with_name(f"{root_dir.name}{LEASE_SUFFIX}")
+
+
+def write_lease(root_dir: Path, *, ttl: Optional[float] = None, owner: Optional[int] = None) -> Lease:
+    """ Write the lease of a mounted dataset
+
+    :param root_dir: root of the mounted dataset
+    :param ttl: time to live in seconds after the last heartbeat (default: no expiration)
+    :param owner: pid of the process owning the dataset (default: current process)
+    :return: the written Lease
+    """
+    now = time.time()
+    owner = owner if owner is not None else os.getpid()
+    lease = Lease(pid=owner, host=socket.gethostname(), created=now, heartbeat=now, ttl=ttl,
+                  pid_start=process_start_time(owner))
+    _save_lease(root_dir, lease)
+    return lease
+
+
+def read_lease(root_dir: Path) -> Optional[Lease]:
+    """ Read the lease of a mounted dataset (None if missing or invalid) """
+    try:
+        with lease_file(root_dir).open() as fp:
+            return Lease(**json.load(fp))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+def renew_lease(location: Union[str, Path]):
+    """ Update the heartbeat of a mounted dataset lease, long running jobs should call this
+    more often than the lease time to live to prevent garbage collection of their mounts.
+
+    :param location: location of the mounted dataset
+    :raises ValueError if the location has no lease
+    """
+    if isinstance(location, str):
+        location = Path(location)
+
+    lease = read_lease(location)
+    if lease is None:
+        raise ValueError(f'{location} has no lease')
+
+    lease.heartbeat = time.time()
+    _save_lease(location, lease)
+
+
+def _save_lease(root_dir: Path, lease: Lease):
+    """ Atomically save the lease of a mounted dataset """
+    location = lease_file(root_dir)
+    # one temporary file per writer as the lease can be renewed concurrently (threads, workers)
+    tmp_file = location.with_name(f"{location.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with tmp_file.open('w') as fp:
+        json.dump(asdict(lease), fp)
+    tmp_file.replace(location)
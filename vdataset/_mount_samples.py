@@ -2,6 +2,7 @@
 
 import json
 import warnings
+from fnmatch import fnmatchcase
 from pathlib import Path
 from typing import Union, List, Dict, Optional
 
@@ -59,15 +60,61 @@ def key_extractor(obj: Dict, key: str):
     return obj
 
 
+def key_selector(obj: Union[Dict, List], keys: Union[str, List[str]]) -> List:
+    """ Select all the sub-items matching a list of keys
+
+    Each key is dot delimited (key1.key2.subItem), segments can be glob patterns (train.*.clean)
+    and list items are selected by their index (key1.0 or key1.*).
+
+    :param obj: the source dictionary
+    :param keys: a key or list of keys to select
+    :return: the list of selected sub-items (each sub-item appears once, in order of selection)
+    :raises KeyError if a key does not match any item
+    """
+    if isinstance(keys, str):
+        keys = [keys]
+
+    selected = []
+    seen = set()
+    for key in keys:
+        if key == "":
+            items = [obj]
+        else:
+            items = [obj]
+            for segment in key.split('.'):
+                matches = []
+                for item in items:
+                    if isinstance(item, dict):
+                        if segment in item.keys():
+                            matches.append(item[segment])
+                        else:
+                            matches.extend(v for k, v in item.items() if fnmatchcase(str(k), segment))
+                    elif isinstance(item, list):
+                        matches.extend(v for i, v in enumerate(item) if fnmatchcase(str(i), segment))
+                items = matches
+
+        if not items:
+            raise KeyError(f"{key} was not found in object !!")
+
+        for item in items:
+            if id(item) not in seen:
+                seen.add(id(item))
+                selected.append(item)
+    return selected
+
+
 def mount_from_location(location: Union[str, Path], *,
                         file_regexp: Optional[List[str]] = None, keep_structure: bool = False,
-                        tmp_prefix: Optional[Union[Path, str]] = None):
+                        tmp_prefix: Optional[Union[Path, str]] = None, lease_ttl: Optional[float] = None,
+                        lease_owner: Optional[int] = None):
     """ Wrapper around the mount function to use a directory as the input.
 
     :param location: directory to use as the input.
     :param file_regexp: list of regular expression to match files
     :param keep_structure: boolean specifying if the folder structure should remain in the virtual dataset
     :param tmp_prefix: prefix location to add mounted dataset
+    :param lease_ttl: time (in seconds) after the last heartbeat when the mount is considered expired
+    :param lease_owner: pid of the process owning the mount (default: current process)
     :return: path to the newly created dataset.
     """
     if isinstance(location, str):
@@ -96,16 +143,21 @@ def mount_from_location(location: Union[str, Path], *,
         files = file_list
 
     # return mount location
-    return mount(files, tmp_prefix=tmp_prefix)
+    return mount(files, tmp_prefix=tmp_prefix, lease_ttl=lease_ttl, lease_owner=lease_owner)
 
 
-def mount_from_index_file(file_location: Union[str, Path], *, key: Optional[str] = None,
-                          tmp_prefix: Optional[Union[Path, str]] = None):
+def mount_from_index_file(file_location: Union[str, Path], *, key: Optional[Union[str, List[str]]] = None,
+                          tmp_prefix: Optional[Union[Path, str]] = None, on_conflict: str = 'error',
+                          lease_ttl: Optional[float] = None, lease_owner: Optional[int] = None):
     """ Wrapper around the mount function to use with a .json/yaml file as input
 
     :param file_location: location of the yaml/json file
-    :param key: if set it contains the path to the sub-item to be used in the file
+    :param key: if set it contains the path (or list of paths/glob patterns) to the sub-items to be used in the file,
+                all selected sub-items are merged in the same mount
     :param tmp_prefix: prefix location to add mounted dataset
+    :param on_conflict: policy when different files share the same target name ['error', 'first', 'last']
+    :param lease_ttl: time (in seconds) after the last heartbeat when the mount is considered expired
+    :param lease_owner: pid of the process owning the mount (default: current process)
     :return: path to the newly created dataset.
     """
     if isinstance(file_location, str):
@@ -117,7 +169,8 @@ def mount_from_index_file(file_location: Union[str, Path], *, key: Optional[str]
     obj = load_dict_from_file(file_location)
 
     if key:
-        obj = key_extractor(obj, key)
+        obj = key_selector(obj, key)
 
     # return mount location
-    return mount(obj, tmp_prefix=tmp_prefix)
+    return mount(obj, tmp_prefix=tmp_prefix, on_conflict=on_conflict,
+                 lease_ttl=lease_ttl, lease_owner=lease_owner)